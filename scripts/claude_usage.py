@@ -0,0 +1,876 @@
+#!/usr/bin/env python3
+"""
+~/.claude 使用数据分析
+
+并行流式解析 history.jsonl、projects/ 会话记录、debug/ 调试日志和
+stats-cache.json，抽取的字段存入列式数组（array）并持久化为快照。
+再次运行时只解析各文件新增的字节，文件被截断或轮转时自动重建对应部分。
+
+用法:
+    python scripts/claude_usage.py                      # 全部报表
+    python scripts/claude_usage.py sessions --top 20    # 会话活跃度
+    python scripts/claude_usage.py tokens               # Token 与缓存命中
+    python scripts/claude_usage.py errors               # 错误模式统计
+    python scripts/claude_usage.py hours                # 每小时分布
+    python scripts/claude_usage.py tokens --json        # JSON 输出
+    python scripts/claude_usage.py bench --size 1024    # 合成数据基准（约 1GB）
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import pickle
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import compress
+from pathlib import Path
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_KEYS = {"version", "claude_dir", "files", "file_names", "strings", "tables", "updated_at"}
+CHUNK_BYTES = 32 * 1024 * 1024  # 大文件按此大小切分为并行任务
+SERIAL_THRESHOLD = 4 * 1024 * 1024  # 新增数据低于此值时不启动进程池
+HEAD_BYTES = 64  # 用于识别原地重写的文件头指纹长度
+
+DEFAULT_CLAUDE_DIR = Path.home() / ".claude"
+# 快照是本地可信的 pickle，放在仓库之外，避免被提交或被替换
+DEFAULT_SNAPSHOT = DEFAULT_CLAUDE_DIR / "cache" / "usage-snapshot.pkl"
+
+# 列式表结构：表名 -> {列名: array typecode}
+TABLES = {
+    "events": {
+        "file": "I", "session": "I", "ts": "d", "kind": "B", "model": "I",
+        "input": "Q", "output": "Q", "cache_read": "Q", "cache_create": "Q",
+    },
+    "history": {"file": "I", "session": "I", "ts": "d", "project": "I"},
+    "debug": {"file": "I", "session": "I", "ts": "d", "level": "B", "pattern": "B"},
+}
+SOURCE_TABLE = {"transcript": "events", "history": "history", "debug": "debug"}
+# 字符串列通过快照中的字符串表编码为整数
+STRING_COLUMNS = ("session", "model", "project")
+
+KIND_USER, KIND_ASSISTANT = 0, 1
+LEVEL_NAMES = ("WARN", "ERROR")
+
+# 错误模式按顺序匹配，先命中者生效
+ERROR_PATTERNS = [
+    ("concurrency_limit", "API 并发限制", re.compile(r"并发数过高|concurrency", re.I)),
+    ("preflight_timeout", "Bash 预检超时", re.compile(r"Pre-flight check is taking longer")),
+    ("rate_limit", "速率限制", re.compile(r"\b429\b|rate.?limit", re.I)),
+    ("eisdir", "EISDIR 目录操作", re.compile(r"EISDIR")),
+    ("enoent", "ENOENT 文件不存在", re.compile(r"ENOENT")),
+    ("json_parse", "JSON 解析错误", re.compile(r"JSON Parse error|Unrecognized token")),
+    ("aborted", "流中断", re.compile(r"AbortError|operation was aborted")),
+    ("stream_stall", "流延迟", re.compile(r"Streaming stall")),
+]
+PATTERN_KEYS = [key for key, _, _ in ERROR_PATTERNS] + ["other"]
+PATTERN_LABELS = [label for _, label, _ in ERROR_PATTERNS] + ["其他"]
+PATTERN_OTHER = len(ERROR_PATTERNS)
+
+DEBUG_LINE = re.compile(rb"^(\S+) \[(WARN|ERROR)\] ([^\r\n]*)", re.M)
+
+
+# ============================================
+# 解析（在工作进程中执行）
+# ============================================
+
+def _parse_iso(value) -> float:
+    """ISO 8601 时间戳 → epoch 秒，无法解析时返回 0.0"""
+    if not value or not isinstance(value, str):
+        return 0.0
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _epoch_ms(value) -> float:
+    """history.jsonl 时间戳（毫秒数，偶见 ISO 字符串）→ epoch 秒"""
+    if isinstance(value, str):
+        return _parse_iso(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        return value / 1000
+    return 0.0
+
+
+def _count(value) -> int:
+    """Token 计数 → 非负整数，非数值按 0 处理"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    try:
+        return min(max(int(value), 0), 0xFFFFFFFFFFFFFFFF)
+    except (OverflowError, ValueError):
+        return 0
+
+
+def _text(value) -> str:
+    return value if isinstance(value, str) else ""
+
+
+def _classify_error(message: str) -> int:
+    for idx, (_, _, pattern) in enumerate(ERROR_PATTERNS):
+        if pattern.search(message):
+            return idx
+    return PATTERN_OTHER
+
+
+class _Interner:
+    """分块内的局部字符串表"""
+
+    __slots__ = ("index", "values")
+
+    def __init__(self):
+        self.index: dict[str, int] = {}
+        self.values: list[str] = []
+
+    def __call__(self, value: str) -> int:
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+
+def _iter_lines(mm: mmap.mmap, start: int, end: int):
+    """逐行产出起始位置落在 [start, end) 内的行（不含换行符）"""
+    pos = start
+    if pos > 0 and mm[pos - 1:pos] != b"\n":
+        nl = mm.find(b"\n", pos)
+        pos = len(mm) if nl == -1 else nl + 1
+    while pos < end:
+        nl = mm.find(b"\n", pos)
+        if nl == -1:
+            nl = len(mm)
+        yield mm[pos:nl]
+        pos = nl + 1
+
+
+def _scan_transcript(mm, start, end, fallback_session, cols, strings):
+    session, model = strings["session"], strings["model"]
+    prev_id = None
+    head = None
+    for line in _iter_lines(mm, start, end):
+        # 先做字节级预筛，跳过 summary / file-history-snapshot 等无关记录
+        if b'"assistant"' not in line and b'"user"' not in line:
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        # 合法 JSON 但结构不符的记录直接跳过，不中断整个解析
+        if not isinstance(rec, dict):
+            continue
+        rtype = rec.get("type")
+        if rtype == "assistant":
+            kind = KIND_ASSISTANT
+        elif rtype == "user":
+            kind = KIND_USER
+        else:
+            continue
+        msg = rec.get("message")
+        if not isinstance(msg, dict):
+            continue
+        usage = msg.get("usage") if kind == KIND_ASSISTANT else None
+        if isinstance(usage, dict) and usage:
+            # 同一条 assistant 消息按内容块拆成多行写入，usage 只计一次
+            msg_id = msg.get("id")
+            if isinstance(msg_id, str):
+                if msg_id == prev_id:
+                    continue
+                if head is None:
+                    head = (len(cols["ts"]), msg_id)
+                prev_id = msg_id
+        else:
+            usage = {}
+        cols["session"].append(session(_text(rec.get("sessionId")) or fallback_session))
+        cols["ts"].append(_parse_iso(rec.get("timestamp")))
+        cols["kind"].append(kind)
+        cols["model"].append(model(_text(msg.get("model"))) if kind else 0)
+        cols["input"].append(_count(usage.get("input_tokens")))
+        cols["output"].append(_count(usage.get("output_tokens")))
+        cols["cache_read"].append(_count(usage.get("cache_read_input_tokens")))
+        cols["cache_create"].append(_count(usage.get("cache_creation_input_tokens")))
+    return head, prev_id
+
+
+def _scan_history(mm, start, end, fallback_session, cols, strings):
+    session, project = strings["session"], strings["project"]
+    for line in _iter_lines(mm, start, end):
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(rec, dict):
+            continue
+        cols["session"].append(session(_text(rec.get("sessionId")) or fallback_session))
+        cols["ts"].append(_epoch_ms(rec.get("timestamp")))
+        cols["project"].append(project(_text(rec.get("project"))))
+    return None, None
+
+
+def _scan_debug(mm, start, end, fallback_session, cols, strings):
+    sid = strings["session"](fallback_session)
+    pos = start
+    if pos > 0 and mm[pos - 1:pos] != b"\n":
+        nl = mm.find(b"\n", pos)
+        pos = len(mm) if nl == -1 else nl + 1
+    # 扫描到 end 所在行的行尾；直接在 mmap 上做正则匹配，只解码 WARN/ERROR 行
+    limit = mm.find(b"\n", end - 1) if end > 0 else 0
+    if limit == -1:
+        limit = len(mm)
+    for m in DEBUG_LINE.finditer(mm, pos, limit):
+        cols["session"].append(sid)
+        cols["ts"].append(_parse_iso(m.group(1).decode("ascii", "replace")))
+        cols["level"].append(LEVEL_NAMES.index(m.group(2).decode()))
+        cols["pattern"].append(_classify_error(m.group(3).decode("utf-8", "replace")))
+    return None, None
+
+
+_SCANNERS = {"transcript": _scan_transcript, "history": _scan_history, "debug": _scan_debug}
+
+
+def scan_chunk(task: tuple) -> dict:
+    """解析一个文件片段，返回不含 file 列的列式结果与局部字符串表"""
+    source, path, start, end, fallback_session = task
+    spec = TABLES[SOURCE_TABLE[source]]
+    cols = {name: array(code) for name, code in spec.items() if name != "file"}
+    strings = {name: _Interner() for name in STRING_COLUMNS}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        head, tail = _SCANNERS[source](mm, start, end, fallback_session, cols, strings)
+    return {
+        "columns": cols,
+        "strings": {name: interner.values for name, interner in strings.items()},
+        "head": head,
+        "tail": tail,
+    }
+
+
+# ============================================
+# 快照
+# ============================================
+
+def discover_sources(claude_dir: Path):
+    """产出 (source, path, fallback_session)"""
+    history = claude_dir / "history.jsonl"
+    if history.is_file():
+        yield "history", history, ""
+    projects = claude_dir / "projects"
+    if projects.is_dir():
+        for path in sorted(projects.rglob("*.jsonl")):
+            if not path.is_file():
+                continue
+            # 子代理记录位于 <sessionId>/subagents/ 下
+            fallback = path.parent.parent.name if path.parent.name == "subagents" else path.stem
+            yield "transcript", path, fallback
+    debug = claude_dir / "debug"
+    if debug.is_dir():
+        for path in sorted(debug.glob("*.txt")):
+            if path.is_file():
+                yield "debug", path, path.stem
+
+
+def _read_head(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(HEAD_BYTES)
+
+
+def _complete_end(path: Path, offset: int, size: int) -> int:
+    """返回 offset 之后最后一个完整行的结束位置（正在写入的半行留到下次）"""
+    if size <= offset:
+        return offset
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        nl = mm.rfind(b"\n", offset, min(size, len(mm)))
+    return offset if nl == -1 else nl + 1
+
+
+class UsageSnapshot:
+    """列式快照：表数据 + 字符串表 + 每个源文件的读取检查点"""
+
+    def __init__(self, claude_dir: Path):
+        self.claude_dir = str(claude_dir)
+        self.files: dict[str, dict] = {}
+        self.file_names: list[str] = []
+        self.strings: dict[str, list[str]] = {name: [] for name in STRING_COLUMNS}
+        self.tables = {
+            table: {name: array(code) for name, code in spec.items()}
+            for table, spec in TABLES.items()
+        }
+        self.updated_at = None
+        self._build_lookup()
+
+    def _build_lookup(self):
+        self._lookup = {
+            name: {value: idx for idx, value in enumerate(values)}
+            for name, values in self.strings.items()
+        }
+
+    def _intern(self, name: str, value: str) -> int:
+        lookup = self._lookup[name]
+        idx = lookup.get(value)
+        if idx is None:
+            idx = lookup[value] = len(self.strings[name])
+            self.strings[name].append(value)
+        return idx
+
+    @classmethod
+    def load(cls, path: Path, claude_dir: Path) -> "UsageSnapshot":
+        """读取快照；文件缺失、损坏或结构不符时返回空快照"""
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError, ValueError, KeyError, TypeError):
+            return cls(claude_dir)
+        if not isinstance(data, dict) or not SNAPSHOT_KEYS <= data.keys():
+            return cls(claude_dir)
+        if data["version"] != SNAPSHOT_VERSION or data["claude_dir"] != str(claude_dir):
+            return cls(claude_dir)
+        snap = cls.__new__(cls)
+        snap.claude_dir = data["claude_dir"]
+        snap.files = data["files"]
+        snap.file_names = data["file_names"]
+        snap.strings = data["strings"]
+        snap.tables = data["tables"]
+        snap.updated_at = data["updated_at"]
+        snap._build_lookup()
+        return snap
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "claude_dir": self.claude_dir,
+            "files": self.files,
+            "file_names": self.file_names,
+            "strings": self.strings,
+            "tables": self.tables,
+            "updated_at": self.updated_at,
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def row_count(self) -> int:
+        return sum(len(cols["file"]) for cols in self.tables.values())
+
+    def _drop_files(self, stale: set[int]):
+        if not stale:
+            return
+        for table, cols in self.tables.items():
+            keep = [idx not in stale for idx in cols["file"]]
+            if all(keep):
+                continue
+            for name, code in TABLES[table].items():
+                cols[name] = array(code, compress(cols[name], keep))
+
+    def _plan(self) -> tuple[list[tuple], list[int], int, int]:
+        """比对检查点，返回 (任务列表, 任务对应的 file 索引, 待解析字节数, 失效文件数)"""
+        claude_dir = Path(self.claude_dir)
+        tasks, owners, stale, seen = [], [], set(), set()
+        total = 0
+        for source, path, fallback in discover_sources(claude_dir):
+            rel = path.relative_to(claude_dir).as_posix()
+            seen.add(rel)
+            try:
+                st = path.stat()
+                head = _read_head(path)
+            except OSError:
+                continue
+            state = self.files.get(rel)
+            if state is not None:
+                rotated = (state["dev"], state["ino"]) != (st.st_dev, st.st_ino)
+                truncated = st.st_size < state["offset"]
+                rewritten = head[:len(state["head"])] != state["head"]
+                if rotated or truncated or rewritten:
+                    stale.add(state["idx"])
+                    state.update(offset=0, tail=None)
+                state.update(dev=st.st_dev, ino=st.st_ino, head=head)
+            else:
+                idx = len(self.file_names)
+                self.file_names.append(rel)
+                state = self.files[rel] = {
+                    "idx": idx, "source": source, "dev": st.st_dev, "ino": st.st_ino,
+                    "head": head, "offset": 0, "tail": None,
+                }
+            end = _complete_end(path, state["offset"], st.st_size)
+            start = state["offset"]
+            state["offset"] = end
+            total += end - start
+            while start < end:
+                stop = min(start + CHUNK_BYTES, end)
+                tasks.append((source, str(path), start, stop, fallback))
+                owners.append(state["idx"])
+                start = stop
+        for rel in list(self.files):
+            if rel not in seen:
+                stale.add(self.files.pop(rel)["idx"])
+        self._drop_files(stale)
+        return tasks, owners, total, len(stale)
+
+    def _merge(self, owner: int, result: dict):
+        state = self.files[self.file_names[owner]]
+        source = state["source"]
+        cols = result["columns"]
+        head = result["head"]
+        # 跨分块边界的重复 assistant 行：上一块末尾与本块开头是同一条消息
+        if head is not None and head[1] == state["tail"]:
+            for column in cols.values():
+                del column[head[0]]
+        if result["tail"] is not None:
+            state["tail"] = result["tail"]
+        table = self.tables[SOURCE_TABLE[source]]
+        for name, local in result["strings"].items():
+            if name not in cols or not local:
+                continue
+            remap = [self._intern(name, value) for value in local]
+            cols[name] = array("I", map(remap.__getitem__, cols[name]))
+        n = len(cols["ts"])
+        for name, column in cols.items():
+            table[name].extend(column)
+        table["file"].extend(array("I", [owner]) * n)
+
+    def update(self, workers: int = 0) -> dict:
+        """增量解析新增内容，返回本次更新的统计"""
+        started = time.perf_counter()
+        tasks, owners, total, dropped = self._plan()
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or total < SERIAL_THRESHOLD or len(tasks) < 2:
+            results = map(scan_chunk, tasks)
+            self._consume(owners, results)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(scan_chunk, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+                self._consume(owners, results)
+        self.updated_at = datetime.now(timezone.utc).isoformat()
+        return {
+            "files": len(set(owners)),
+            "tasks": len(tasks),
+            "bytes": total,
+            "dropped": dropped,
+            "seconds": time.perf_counter() - started,
+        }
+
+    def _consume(self, owners: list[int], results):
+        for owner, result in zip(owners, results):
+            self._merge(owner, result)
+
+
+def load_snapshot(args) -> UsageSnapshot:
+    claude_dir = Path(args.claude_dir).expanduser().resolve()
+    snapshot_path = Path(args.snapshot).expanduser()
+    if args.rebuild:
+        snap = UsageSnapshot(claude_dir)
+    else:
+        snap = UsageSnapshot.load(snapshot_path, claude_dir)
+    stats = snap.update(args.workers)
+    if stats["bytes"] or stats["dropped"] or args.rebuild:
+        snap.save(snapshot_path)
+    if args.verbose:
+        print(
+            f"[快照] 解析 {stats['files']} 个文件 / {stats['bytes'] / 1e6:.1f} MB，"
+            f"{stats['seconds']:.2f}s，共 {snap.row_count():,} 行",
+            file=sys.stderr,
+        )
+    return snap
+
+
+# ============================================
+# 报表
+# ============================================
+
+def _local_hour_offset() -> float:
+    """当前时区相对 UTC 的秒数（按固定偏移计算小时分布）"""
+    return datetime.now().astimezone().utcoffset().total_seconds()
+
+
+def _fmt_ts(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M") if ts else "-"
+
+
+def report_sessions(snap: UsageSnapshot, top: int) -> list[dict]:
+    names = snap.strings["session"]
+    stats = defaultdict(lambda: {
+        "prompts": 0, "user": 0, "assistant": 0, "tokens": 0, "errors": 0,
+        "start": 0.0, "end": 0.0,
+    })
+
+    def touch(item, ts):
+        if ts:
+            item["start"] = min(item["start"], ts) if item["start"] else ts
+            item["end"] = max(item["end"], ts)
+
+    ev = snap.tables["events"]
+    for sid, ts, kind, i, o in zip(ev["session"], ev["ts"], ev["kind"], ev["input"], ev["output"]):
+        item = stats[sid]
+        item["assistant" if kind else "user"] += 1
+        item["tokens"] += i + o
+        touch(item, ts)
+    hist = snap.tables["history"]
+    # history.jsonl 中缺少 sessionId 的记录无法归属会话，不计入本报表
+    unassigned = snap._lookup["session"].get("")
+    for sid, ts in zip(hist["session"], hist["ts"]):
+        if sid == unassigned:
+            continue
+        item = stats[sid]
+        item["prompts"] += 1
+        touch(item, ts)
+    for sid, level in zip(snap.tables["debug"]["session"], snap.tables["debug"]["level"]):
+        if level == 1:
+            stats[sid]["errors"] += 1
+
+    rows = []
+    for sid, item in stats.items():
+        rows.append({
+            "session": names[sid],
+            "messages": item["user"] + item["assistant"],
+            "prompts": item["prompts"],
+            "tokens": item["tokens"],
+            "errors": item["errors"],
+            "start": _fmt_ts(item["start"]),
+            "minutes": round((item["end"] - item["start"]) / 60, 1),
+        })
+    rows.sort(key=lambda r: (-r["messages"], -r["prompts"]))
+    return rows[:top] if top else rows
+
+
+def _read_stats_cache(claude_dir: Path) -> dict:
+    try:
+        with open(claude_dir / "stats-cache.json", encoding="utf-8") as f:
+            return json.load(f).get("modelUsage") or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _cache_hit(fresh: int, read: int, create: int) -> float:
+    total = fresh + read + create
+    return round(read / total, 4) if total else 0.0
+
+
+def report_tokens(snap: UsageSnapshot) -> dict:
+    names = snap.strings["model"]
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0])
+    ev = snap.tables["events"]
+    for kind, model, i, o, cr, cc in zip(
+        ev["kind"], ev["model"], ev["input"], ev["output"], ev["cache_read"], ev["cache_create"]
+    ):
+        if kind != KIND_ASSISTANT:
+            continue
+        t = totals[model]
+        t[0] += 1
+        t[1] += i
+        t[2] += o
+        t[3] += cr
+        t[4] += cc
+    models = []
+    for model, (calls, i, o, cr, cc) in sorted(totals.items(), key=lambda kv: -kv[1][1] - kv[1][2]):
+        models.append({
+            "model": names[model] or "(unknown)",
+            "responses": calls,
+            "input": i,
+            "output": o,
+            "cache_read": cr,
+            "cache_create": cc,
+            "cache_hit_rate": _cache_hit(i, cr, cc),
+        })
+    stats_cache = {}
+    for model, usage in _read_stats_cache(Path(snap.claude_dir)).items():
+        stats_cache[model] = {
+            "input": usage.get("inputTokens", 0),
+            "output": usage.get("outputTokens", 0),
+            "cache_read": usage.get("cacheReadInputTokens", 0),
+            "cache_create": usage.get("cacheCreationInputTokens", 0),
+            "cache_hit_rate": _cache_hit(
+                usage.get("inputTokens", 0),
+                usage.get("cacheReadInputTokens", 0),
+                usage.get("cacheCreationInputTokens", 0),
+            ),
+        }
+    return {"transcripts": models, "stats_cache": stats_cache}
+
+
+def report_errors(snap: UsageSnapshot, top: int) -> dict:
+    dbg = snap.tables["debug"]
+    by_pattern = Counter(zip(dbg["pattern"], dbg["level"]))
+    patterns = []
+    for idx, key in enumerate(PATTERN_KEYS):
+        warn, error = by_pattern.get((idx, 0), 0), by_pattern.get((idx, 1), 0)
+        if warn or error:
+            patterns.append({"pattern": key, "label": PATTERN_LABELS[idx], "warn": warn, "error": error})
+    patterns.sort(key=lambda p: -(p["warn"] + p["error"]))
+    names = snap.strings["session"]
+    # 与 report_sessions 的“错误”列口径一致，只统计 ERROR
+    per_session = Counter(sid for sid, level in zip(dbg["session"], dbg["level"]) if level == 1)
+    return {
+        "patterns": patterns,
+        "sessions": [
+            {"session": names[sid], "count": count}
+            for sid, count in per_session.most_common(top or None)
+        ],
+    }
+
+
+def report_hours(snap: UsageSnapshot) -> dict:
+    offset = _local_hour_offset()
+
+    def histogram(column):
+        counts = Counter(int((ts + offset) // 3600 % 24) for ts in column if ts)
+        return [counts.get(hour, 0) for hour in range(24)]
+
+    return {
+        "messages": histogram(snap.tables["events"]["ts"]),
+        "prompts": histogram(snap.tables["history"]["ts"]),
+        "errors": histogram(snap.tables["debug"]["ts"]),
+    }
+
+
+def print_sessions(rows: list[dict]):
+    print("=== 会话活跃度 ===")
+    print(f"{'会话ID':<12} {'消息':>7} {'提问':>6} {'Token':>12} {'错误':>6} {'开始时间':<17} {'时长(分)':>9}")
+    print("-" * 80)
+    for r in rows:
+        print(
+            f"{r['session'][:10]:<12} {r['messages']:>7} {r['prompts']:>6} {r['tokens']:>12,} "
+            f"{r['errors']:>6} {r['start']:<17} {r['minutes']:>9}"
+        )
+
+
+def print_tokens(report: dict):
+    print("=== Token 使用（会话记录） ===")
+    for m in report["transcripts"]:
+        print(f"\n模型: {m['model']}  ({m['responses']} 次响应)")
+        print(f"  输入 Token: {m['input']:,}")
+        print(f"  输出 Token: {m['output']:,}")
+        print(f"  缓存命中: {m['cache_read']:,}")
+        print(f"  缓存创建: {m['cache_create']:,}")
+        print(f"  缓存命中率: {m['cache_hit_rate']:.1%}")
+    if report["stats_cache"]:
+        print("\n=== Token 使用（stats-cache.json） ===")
+        for model, usage in report["stats_cache"].items():
+            print(
+                f"{model}: 输入 {usage['input']:,} / 输出 {usage['output']:,} / "
+                f"缓存命中率 {usage['cache_hit_rate']:.1%}"
+            )
+
+
+def print_errors(report: dict):
+    print("=== 错误模式 ===")
+    print(f"{'模式':<20} {'WARN':>8} {'ERROR':>8}")
+    print("-" * 40)
+    for p in report["patterns"]:
+        print(f"{p['label']:<20} {p['warn']:>8} {p['error']:>8}")
+    print("\n=== ERROR 最多的会话 ===")
+    for s in report["sessions"]:
+        print(f"{s['count']:>6}  {s['session']}")
+
+
+def print_hours(report: dict):
+    print("=== 每小时分布（本地时间） ===")
+    peak = max(report["messages"] + report["prompts"]) or 1
+    print(f"{'时段':<6} {'消息':>8} {'提问':>6} {'错误':>6}")
+    for hour in range(24):
+        msgs = report["messages"][hour]
+        bar = "█" * round(msgs / peak * 30)
+        print(f"{hour:02d}:00 {msgs:>8} {report['prompts'][hour]:>6} {report['errors'][hour]:>6} {bar}")
+
+
+# ============================================
+# 合成数据基准
+# ============================================
+
+_PAD = "分析数据结构并生成报告。" * 40
+_COMPACT = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def generate_synthetic(claude_dir: Path, size_mb: int, seed: int = 0) -> int:
+    """生成约 size_mb 的合成 ~/.claude 数据，返回实际字节数"""
+    rng = random.Random(seed)
+    budget = size_mb * 1024 * 1024
+    project_dir = claude_dir / "projects" / "-workspaces-Skills-demo"
+    project_dir.mkdir(parents=True, exist_ok=True)
+    (claude_dir / "debug").mkdir(parents=True, exist_ok=True)
+    models = ["glm-4.7", "claude-sonnet-4-5-20250929"]
+    errors = [
+        "Error: 您当前使用该API的并发数过高，请降低并发",
+        "Pre-flight check is taking longer than expected",
+        "Error: EISDIR: illegal operation on a directory",
+        "Streaming stall detected",
+        "AbortError: The operation was aborted",
+    ]
+    base = 1769500000.0
+    written = 0
+    with open(claude_dir / "history.jsonl", "w", encoding="utf-8") as history:
+        while written < budget:
+            sid = str(uuid.UUID(int=rng.getrandbits(128)))
+            ts = base + rng.random() * 30 * 86400
+            lines, debug_lines, prompts = [], [], []
+            for turn in range(rng.randint(200, 600)):
+                ts += rng.random() * 30
+                iso = datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+                if turn % 5 == 0:
+                    prompts.append(json.dumps({
+                        "display": f"任务 {turn}", "pastedContents": {}, "timestamp": int(ts * 1000),
+                        "project": "/workspaces/Skills_demo", "sessionId": sid,
+                    }, **_COMPACT))
+                lines.append(json.dumps({
+                    "type": "user", "timestamp": iso, "sessionId": sid,
+                    "message": {"role": "user", "content": f"步骤 {turn}"},
+                }, **_COMPACT))
+                msg = {
+                    "id": f"msg_{sid[:8]}_{turn}", "role": "assistant", "model": rng.choice(models),
+                    "content": [{"type": "text", "text": _PAD}],
+                    "usage": {
+                        "input_tokens": rng.randint(10, 2000),
+                        "output_tokens": rng.randint(10, 1500),
+                        "cache_read_input_tokens": rng.randint(0, 60000),
+                        "cache_creation_input_tokens": rng.randint(0, 4000),
+                    },
+                }
+                line = json.dumps({"type": "assistant", "timestamp": iso, "sessionId": sid, "message": msg},
+                                  **_COMPACT)
+                lines.append(line)
+                if turn % 7 == 0:
+                    lines.append(line)  # 同一消息的第二个内容块
+                debug_lines.append(f"{iso} [DEBUG] Applying permission update: Adding 7 allow rule(s)")
+                if rng.random() < 0.05:
+                    debug_lines.append(f"{iso} [{rng.choice(LEVEL_NAMES)}] {rng.choice(errors)}")
+            body = "\n".join(lines) + "\n"
+            (project_dir / f"{sid}.jsonl").write_text(body, encoding="utf-8")
+            debug_body = "\n".join(debug_lines) + "\n"
+            (claude_dir / "debug" / f"{sid}.txt").write_text(debug_body, encoding="utf-8")
+            history_body = "\n".join(prompts) + "\n"
+            history.write(history_body)
+            written += sum(len(s.encode("utf-8")) for s in (body, debug_body, history_body))
+    return written
+
+
+def _append_synthetic(claude_dir: Path, fraction: float) -> int:
+    """向部分会话文件追加内容，模拟增量活动"""
+    files = sorted((claude_dir / "projects").rglob("*.jsonl"))
+    added = 0
+    for path in files[: max(1, int(len(files) * fraction))]:
+        with open(path, "rb") as f:
+            tail = f.readlines()[-2:]
+        data = b"".join(tail)
+        with open(path, "ab") as f:
+            f.write(data)
+        added += len(data)
+    return added
+
+
+def run_bench(args):
+    root = Path(tempfile.mkdtemp(prefix="claude-usage-bench-"))
+    try:
+        claude_dir = root / ".claude"
+        snapshot_path = root / "snapshot.pkl"
+        print(f"生成合成数据 {args.size} MB → {claude_dir}")
+        t0 = time.perf_counter()
+        size = generate_synthetic(claude_dir, args.size)
+        print(f"  {size / 1e6:.1f} MB，{time.perf_counter() - t0:.1f}s\n")
+
+        workers = args.workers or os.cpu_count() or 1
+        rows = []
+
+        def measure(label, snap, n_workers):
+            stats = snap.update(n_workers)
+            t = time.perf_counter()
+            snap.save(snapshot_path)
+            save = time.perf_counter() - t
+            mbps = stats["bytes"] / 1e6 / stats["seconds"] if stats["seconds"] else 0.0
+            rows.append((label, n_workers, stats["bytes"] / 1e6, stats["seconds"], mbps, save))
+            return snap
+
+        measure("冷启动（串行）", UsageSnapshot(claude_dir), 1)
+        snap = measure("冷启动（并行）", UsageSnapshot(claude_dir), workers)
+        t = time.perf_counter()
+        snap = UsageSnapshot.load(snapshot_path, claude_dir)
+        load = time.perf_counter() - t
+        measure("无变化增量", snap, workers)
+        _append_synthetic(claude_dir, 0.01)
+        measure("追加 1% 会话", snap, workers)
+        t = time.perf_counter()
+        report_sessions(snap, 0)
+        report_tokens(snap)
+        report_errors(snap, 10)
+        report_hours(snap)
+        reports = time.perf_counter() - t
+
+        print(f"{'场景':<16} {'进程':>4} {'解析MB':>9} {'耗时s':>8} {'MB/s':>8} {'保存s':>7}")
+        print("-" * 60)
+        for label, n, mb, sec, mbps, save in rows:
+            print(f"{label:<16} {n:>4} {mb:>9.1f} {sec:>8.2f} {mbps:>8.1f} {save:>7.2f}")
+        print(f"\n快照: {snapshot_path.stat().st_size / 1e6:.1f} MB，{snap.row_count():,} 行，加载 {load:.2f}s")
+        print(f"全部报表: {reports:.2f}s")
+    finally:
+        if args.keep:
+            print(f"\n保留数据目录: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+# ============================================
+# CLI
+# ============================================
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="~/.claude 使用数据分析")
+    parser.add_argument("command", nargs="?", default="all",
+                        choices=["all", "sessions", "tokens", "errors", "hours", "bench"])
+    parser.add_argument("--claude-dir", default=str(DEFAULT_CLAUDE_DIR), help="数据目录（默认 ~/.claude）")
+    parser.add_argument("--snapshot", default=str(DEFAULT_SNAPSHOT),
+                        help="列式快照路径（默认 ~/.claude/cache/usage-snapshot.pkl，仅加载可信文件）")
+    parser.add_argument("--workers", type=int, default=0, help="解析进程数（默认 CPU 核数，1 为串行）")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有快照，全量重建")
+    parser.add_argument("--top", type=int, default=10, help="会话/错误列表条数（0 为全部）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出快照更新统计")
+    parser.add_argument("--size", type=int, default=64, help="bench: 合成数据大小（MB）")
+    parser.add_argument("--keep", action="store_true", help="bench: 保留合成数据目录")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "bench":
+        run_bench(args)
+        return 0
+
+    snap = load_snapshot(args)
+    reports = {}
+    if args.command in ("all", "sessions"):
+        reports["sessions"] = report_sessions(snap, args.top)
+    if args.command in ("all", "tokens"):
+        reports["tokens"] = report_tokens(snap)
+    if args.command in ("all", "errors"):
+        reports["errors"] = report_errors(snap, args.top)
+    if args.command in ("all", "hours"):
+        reports["hours"] = report_hours(snap)
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return 0
+    printers = {"sessions": print_sessions, "tokens": print_tokens, "errors": print_errors, "hours": print_hours}
+    for idx, (name, report) in enumerate(reports.items()):
+        if idx:
+            print()
+        printers[name](report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""scripts/claude_usage.py 增量快照回归测试"""
+
+import importlib.util
+import os
+import pickle
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "claude_usage.py"
+_spec = importlib.util.spec_from_file_location("claude_usage", SCRIPT)
+cu = importlib.util.module_from_spec(_spec)
+sys.modules["claude_usage"] = cu  # 进程池需按模块名序列化 scan_chunk
+_spec.loader.exec_module(cu)
+
+
+def reports(snap):
+    return (
+        cu.report_sessions(snap, 0),
+        cu.report_tokens(snap),
+        cu.report_errors(snap, 0),
+        cu.report_hours(snap),
+    )
+
+
+def fresh(claude_dir):
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(1)
+    return reports(snap)
+
+
+@pytest.fixture
+def claude_dir(tmp_path):
+    path = tmp_path / ".claude"
+    cu.generate_synthetic(path, 4)
+    return path
+
+
+@pytest.fixture
+def transcripts(claude_dir):
+    return sorted((claude_dir / "projects").rglob("*.jsonl"))
+
+
+def test_chunked_parse_matches_whole_file(claude_dir, monkeypatch):
+    whole = fresh(claude_dir)
+    monkeypatch.setattr(cu, "CHUNK_BYTES", 4096)
+    assert fresh(claude_dir) == whole
+
+
+def test_duplicate_assistant_rows_counted_once(claude_dir):
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(1)
+    responses = sum(m["responses"] for m in cu.report_tokens(snap)["transcripts"])
+    ids = set()
+    for path in (claude_dir / "projects").rglob("*.jsonl"):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if '"type":"assistant"' in line:
+                ids.add(line.split('"id":"', 1)[1].split('"', 1)[0])
+    assert responses == len(ids)
+
+
+def test_partial_line_is_held_back(claude_dir, transcripts, tmp_path):
+    snapshot = tmp_path / "snap.pkl"
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(1)
+    snap.save(snapshot)
+
+    donor = transcripts[1].read_bytes().split(b"\n")[0]
+    with open(transcripts[0], "ab") as f:
+        f.write(donor + b"\n" + b'{"type":"user"')
+    snap = cu.UsageSnapshot.load(snapshot, claude_dir)
+    snap.update(1)
+    snap.save(snapshot)
+
+    with open(transcripts[0], "ab") as f:
+        f.write(b',"timestamp":"2026-01-01T00:00:00Z","sessionId":"late","message":{}}\n')
+    snap = cu.UsageSnapshot.load(snapshot, claude_dir)
+    snap.update(1)
+    assert reports(snap) == fresh(claude_dir)
+    assert "late" in snap.strings["session"]
+
+
+def test_truncation_rotation_and_deletion_rebuild(claude_dir, transcripts):
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(1)
+
+    data = transcripts[0].read_bytes()
+    transcripts[0].write_bytes(data[: len(data) // 3].rsplit(b"\n", 1)[0] + b"\n")
+    snap.update(1)
+    assert reports(snap) == fresh(claude_dir)
+
+    replacement = transcripts[1].with_suffix(".new")
+    replacement.write_bytes(transcripts[2].read_bytes())
+    os.replace(replacement, transcripts[1])
+    transcripts[2].unlink()
+    stats = snap.update(1)
+    assert stats["dropped"] == 2
+    assert reports(snap) == fresh(claude_dir)
+
+
+def test_unchanged_tree_parses_nothing(claude_dir):
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(1)
+    assert snap.update(1)["bytes"] == 0
+
+
+def test_parallel_matches_serial(claude_dir, monkeypatch):
+    serial = fresh(claude_dir)
+    monkeypatch.setattr(cu, "CHUNK_BYTES", 64 * 1024)
+    monkeypatch.setattr(cu, "SERIAL_THRESHOLD", 0)
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(2)
+    assert reports(snap) == serial
+
+
+@pytest.mark.parametrize("payload", [[1, 2], {"version": cu.SNAPSHOT_VERSION}])
+def test_malformed_snapshot_falls_back(claude_dir, tmp_path, payload):
+    snapshot = tmp_path / "bad.pkl"
+    snapshot.write_bytes(pickle.dumps(payload))
+    snap = cu.UsageSnapshot.load(snapshot, claude_dir)
+    assert snap.row_count() == 0
+    assert snap.files == {}
+
+
+def test_session_and_error_reports_agree(claude_dir):
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(1)
+    sessions = {row["session"]: row["errors"] for row in cu.report_sessions(snap, 0)}
+    for row in cu.report_errors(snap, 0)["sessions"]:
+        assert sessions[row["session"]] == row["count"]
+
+
+BAD_TRANSCRIPT_LINES = [
+    b'[1,"user"]',
+    b'"assistant"',
+    b'{"type":"assistant","timestamp":"2026-01-01T00:00:00Z","sessionId":"bad","message":"oops"}',
+    b'{"type":"user","timestamp":"2026-01-01T00:00:00Z","sessionId":"bad","message":null}',
+]
+BAD_HISTORY_LINES = [b'[1,"user"]', b"null", b'"user"']
+
+
+def _inject(path, lines):
+    data = path.read_bytes().split(b"\n")
+    mid = len(data) // 2
+    path.write_bytes(b"\n".join(data[:mid] + lines + data[mid:]))
+
+
+def test_malformed_records_are_skipped(claude_dir, transcripts, monkeypatch):
+    clean = fresh(claude_dir)
+    _inject(transcripts[0], BAD_TRANSCRIPT_LINES)
+    _inject(claude_dir / "history.jsonl", BAD_HISTORY_LINES)
+    assert fresh(claude_dir) == clean
+    monkeypatch.setattr(cu, "SERIAL_THRESHOLD", 0)
+    monkeypatch.setattr(cu, "CHUNK_BYTES", 64 * 1024)
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(2)
+    assert reports(snap) == clean
+
+
+def test_loosely_typed_values_are_coerced(tmp_path):
+    claude_dir = tmp_path / ".claude"
+    project = claude_dir / "projects" / "-p"
+    project.mkdir(parents=True)
+    (claude_dir / "history.jsonl").write_text(
+        '{"timestamp":"2026-01-01T00:00:00Z","sessionId":"s1","project":"/p"}\n'
+        '{"timestamp":{"ms":1},"sessionId":"s1","project":7}\n',
+        encoding="utf-8",
+    )
+    (project / "s1.jsonl").write_text(
+        '{"type":"assistant","timestamp":"2026-01-01T00:00:01Z","sessionId":"s1",'
+        '"message":{"id":"m1","model":"glm","usage":{"input_tokens":1.5,"output_tokens":"9",'
+        '"cache_read_input_tokens":-3,"cache_creation_input_tokens":null}}}\n'
+        '{"type":"assistant","timestamp":"2026-01-01T00:00:02Z","sessionId":"s1",'
+        '"message":{"id":"m2","model":["x"],"usage":"none"}}\n',
+        encoding="utf-8",
+    )
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(1)
+    hist = snap.tables["history"]["ts"]
+    assert hist[0] == cu._parse_iso("2026-01-01T00:00:00Z") and hist[1] == 0.0
+    tokens = {m["model"]: m for m in cu.report_tokens(snap)["transcripts"]}
+    assert (tokens["glm"]["input"], tokens["glm"]["output"], tokens["glm"]["cache_read"]) == (1, 0, 0)
+    assert tokens["(unknown)"]["responses"] == 1
+
+
+def test_history_without_session_is_not_a_session_row(claude_dir):
+    with open(claude_dir / "history.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"display":"x","timestamp":1769500000000,"project":"/p"}\n')
+    snap = cu.UsageSnapshot(claude_dir)
+    snap.update(1)
+    assert all(row["session"] for row in cu.report_sessions(snap, 0))
+    assert len(snap.tables["history"]["ts"]) == sum(cu.report_hours(snap)["prompts"])